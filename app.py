@@ -14,66 +14,15 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
-import math
 import os
 from datetime import datetime
 import time
 import importlib
-from metaheuristic import solve_sdvrp_with_metaheuristic
+from metaheuristic import solve_sdvrp_with_metaheuristic, compute_distance_matrix
 from solve import solve_sdvrp_with_gurobi as solve_sdvrp_with_gurobi_base
-from sdvrp_solver import solve_sdvrp_with_gurobi as solve_sdvrp_with_gurobi_advanced
+from sdvrp_solver import solve_sdvrp_with_gurobi as solve_sdvrp_with_gurobi_advanced, vehicle_bound
 
 
-class SDVRP_Solution:
-    def __init__(self, routes, cost, deliveries, truck_loads):
-        self.routes = routes
-        self.cost = cost
-        self.num_deliveries = deliveries
-        self.truck_loads = truck_loads
-
-def parse_solution_file(solution_file):
-    """Parse le fichier de solution généré"""
-    try:
-        with open(solution_file, 'r') as f:
-            lines = f.readlines()
-        
-        if not lines:
-            return None
-            
-        # Parser le coût total
-        cost_line = next(line for line in lines if line.startswith('Total cost'))
-        cost = float(cost_line.split(': ')[1])
-        
-        # Parser les routes
-        routes = []
-        for line in lines:
-            if line.startswith('Route'):
-                route_parts = line.split(': ')[1].strip().split(' - ')
-                route = []
-                for i in range(1, len(route_parts)-1):  # Ignorer le premier et dernier 0
-                    part = route_parts[i]
-                    if '(' in part:
-                        client, qty = part.split('(')
-                        client = int(client.strip())
-                        qty = int(qty.strip(')').strip())
-                        route.append((client, qty))
-                if route:  # N'ajouter que les routes non vides
-                    routes.append(route)
-        
-        # Parser le nombre de livraisons
-        deliveries_line = next(line for line in lines if line.startswith('Number of deliveries'))
-        num_deliveries = int(deliveries_line.split(': ')[1])
-        
-        # Parser les charges des camions
-        loads_line = next(line for line in lines if line.startswith('Trucks loads'))
-        truck_loads = [int(load) for load in loads_line.split(': ')[1].split()]
-        
-        return SDVRP_Solution(routes, cost, num_deliveries, truck_loads)
-        
-    except Exception as e:
-        st.error(f"Erreur lors de la lecture du fichier de solution: {str(e)}")
-        return None
-
 def create_solution_visualization(solver, solution):
     fig = go.Figure()
     
@@ -88,39 +37,48 @@ def create_solution_visualization(solver, solution):
         name='Dépôt'
     ))
     
-    # Ajout des clients
-    for i, coords in enumerate(solver.clients):
-        fig.add_trace(go.Scatter(
-            x=[coords[0]],
-            y=[coords[1]],
-            mode='markers+text',
-            marker=dict(size=10),
-            text=[f'Client {i+1}\nDemande: {solver.demands[i]}'],
-            textposition='top center',
-            name=f'Client {i+1}'
-        ))
+    # Ajout des clients (une seule trace pour tous les clients)
+    fig.add_trace(go.Scatter(
+        x=[coords[0] for coords in solver.clients],
+        y=[coords[1] for coords in solver.clients],
+        mode='markers+text',
+        marker=dict(size=10),
+        text=[f'Client {i+1}\nDemande: {solver.demands[i]}' for i in range(len(solver.clients))],
+        textposition='top center',
+        name='Clients'
+    ))
     
-    # Tracé des routes
+    # Tracé des routes : une trace par couleur, segments séparés par None
     colors = px.colors.qualitative.Set3
+    groups = {}
     for i, route in enumerate(solution.routes):
         if not route:
             continue
             
-        route_coords = [(solver.depot[0], solver.depot[1])]  # Début au dépôt
+        label = f'Route {i+1} (Charge: {sum(qty for _, qty in route)})'
+        x_coords, y_coords, labels, names = groups.setdefault(i % len(colors), ([], [], [], []))
+        x_coords.append(solver.depot[0])  # Début au dépôt
+        y_coords.append(solver.depot[1])
         for client, qty in route:
             client_coords = solver.clients[client-1]
-            route_coords.append((client_coords[0], client_coords[1]))
-        route_coords.append((solver.depot[0], solver.depot[1]))  # Retour au dépôt
-        
-        x_coords = [coord[0] for coord in route_coords]
-        y_coords = [coord[1] for coord in route_coords]
-        
+            x_coords.append(client_coords[0])
+            y_coords.append(client_coords[1])
+        x_coords += [solver.depot[0], None]  # Retour au dépôt puis coupure du tracé
+        y_coords += [solver.depot[1], None]
+        labels += [label] * (len(route) + 2) + [None]
+        names.append(label)
+    
+    # Légende : la route et sa charge si elle est seule dans sa couleur, sinon un libellé
+    # court par groupe (le détail de chaque route reste dans le survol)
+    for color_idx, (x_coords, y_coords, labels, names) in groups.items():
         fig.add_trace(go.Scatter(
             x=x_coords,
             y=y_coords,
             mode='lines+markers',
-            line=dict(color=colors[i % len(colors)], width=2),
-            name=f'Route {i+1} (Charge: {sum(qty for _, qty in route)})'
+            line=dict(color=colors[color_idx], width=2),
+            text=labels,
+            hoverinfo='x+y+text',
+            name=names[0] if len(names) == 1 else f'Groupe {color_idx + 1} ({len(names)} routes)'
         ))
     
     fig.update_layout(
@@ -131,32 +89,28 @@ def create_solution_visualization(solver, solution):
     
     return fig
 
-def parse_case_file(file_path):
-    """Parse le fichier d'entrée et valide les données"""
+@st.cache_data(show_spinner=False)
+def parse_case_file(file_path, file_mtime=None):
+    """Parse le fichier d'entrée et valide les données (mis en cache tant que file_mtime ne change pas)"""
     try:
         with open(file_path, 'r') as f:
-            lines = [line.strip() for line in f.readlines() if line.strip()]
-        
-        # Première ligne
-        parts = lines[0].split()
-        num_clients, vehicle_capacity = map(int, parts[:2])
-        
-        # Validation basique
-        if num_clients <= 0 or vehicle_capacity <= 0:
-            raise ValueError("Nombre de clients ou capacité invalide")
-        
-        # Deuxième ligne: demandes
-        demands = list(map(int, lines[1].split()))
-        if len(demands) != num_clients:
-            st.error(f"Nombre de demandes ({len(demands)}) ne correspond pas au nombre de clients ({num_clients})")
-            raise ValueError("Mismatch in number of demands")
+            # Première ligne
+            parts = f.readline().split()
+            num_clients, vehicle_capacity = map(int, parts[:2])
+            
+            # Validation basique
+            if num_clients <= 0 or vehicle_capacity <= 0:
+                raise ValueError("Nombre de clients ou capacité invalide")
+            
+            # Deuxième ligne: demandes
+            demands = np.fromstring(f.readline(), dtype=np.int32, sep=' ')
+            if len(demands) != num_clients:
+                st.error(f"Nombre de demandes ({len(demands)}) ne correspond pas au nombre de clients ({num_clients})")
+                raise ValueError("Mismatch in number of demands")
 
-        # Coordonnées
-        coordinates = []
-        for line in lines[2:num_clients+3]:
+            # Coordonnées (dépôt + clients)
             try:
-                x, y = map(float, line.split())
-                coordinates.append((x, y))
+                coordinates = np.loadtxt(f, dtype=np.float64, max_rows=num_clients + 1, ndmin=2)
             except Exception as e:
                 st.error(f"Erreur lors de la lecture des coordonnées: {str(e)}")
                 raise
@@ -195,7 +149,7 @@ def display_solution_details(solver, solution, solve_time):
                 total_distance = 0
                 
                 for client, qty in route:
-                    distance = solver.distances[prev_node][client]
+                    distance = solver.distances[prev_node, client]
                     total_distance += distance
                     route_data.append({
                         'Client': client,
@@ -205,7 +159,7 @@ def display_solution_details(solver, solution, solve_time):
                     prev_node = client
                 
                 # Ajouter la distance de retour au dépôt
-                total_distance += solver.distances[prev_node][0]
+                total_distance += solver.distances[prev_node, 0]
                 
                 if route_data:
                     route_df = pd.DataFrame(route_data)
@@ -224,6 +178,11 @@ def display_solution_details(solver, solution, solve_time):
         except Exception as e:
             st.error(f"Erreur lors de la visualisation: {str(e)}")
 
+@st.cache_data(show_spinner=False)
+def build_distance_matrix(coordinates):
+    """Matrice des distances mise en cache entre les reruns Streamlit"""
+    return compute_distance_matrix(coordinates)
+
 class DummyExactSolver:
     """Classe minimale pour supporter la visualisation des résultats"""
     def __init__(self, num_clients, vehicle_capacity, demands, coordinates):
@@ -236,15 +195,8 @@ class DummyExactSolver:
         self.distances = self._calculate_distances()
     
     def _calculate_distances(self):
-        n = len(self.coordinates)
-        distances = [[0] * n for _ in range(n)]
-        for i in range(n):
-            for j in range(n):
-                if i != j:
-                    distances[i][j] = math.floor(
-                        math.sqrt((self.coordinates[j][0] - self.coordinates[i][0])**2 +
-                                  (self.coordinates[j][1] - self.coordinates[i][1])**2) + 0.5)
-        return distances
+        # Même matrice que la métaheuristique : floor(sqrt(dx² + dy²) + 0.5)
+        return build_distance_matrix(self.coordinates)
 def show_about():
     st.sidebar.markdown("---")
     st.sidebar.header("À propos")
@@ -298,7 +250,7 @@ def main():
     if selected_file:
         try:
             # Chargement et parsing des données
-            case_data = parse_case_file(selected_file)
+            case_data = parse_case_file(selected_file, os.path.getmtime(selected_file))
             
             # Affichage des détails de l'instance
             with st.expander("Détails de l'Instance", expanded=True):
@@ -319,21 +271,36 @@ def main():
                         output_file = f"solution_{selected_file}"
                         
                         if solver_method == "Métaheuristique":
-                            solve_sdvrp_with_metaheuristic(selected_file, output_file, 
-                                                         max_iterations=max_iterations,
-                                                         time_limit=max_time)
+                            solution, solution_content = solve_sdvrp_with_metaheuristic(
+                                selected_file, output_file,
+                                max_iterations=max_iterations,
+                                time_limit=max_time)
                         else:
                             # Extraire le numéro du cas
                             case_number = int(''.join(filter(str.isdigit, selected_file)))
                             
                             # Choisir le solveur approprié
                             if case_number <= 6:
-                                solve_sdvrp_with_gurobi_base(selected_file, output_file, time_limit=max_time)
+                                solution, solution_content = solve_sdvrp_with_gurobi_base(
+                                    selected_file, output_file, time_limit=max_time)
                             else:
-                                solve_sdvrp_with_gurobi_advanced(selected_file, output_file, time_limit=max_time)
+                                # Démarrage à chaud : solution rapide de la métaheuristique comme MIP start.
+                                # Sans livraison fractionnée, chaque client de demande > Q/2 occupe sa propre
+                                # route : s'ils sont plus nombreux que M, le MIP start serait ignoré.
+                                demands = case_data['demands']
+                                capacity = case_data['vehicle_capacity']
+                                warm_routes = None
+                                if np.count_nonzero(2 * demands > capacity) <= vehicle_bound(demands, capacity):
+                                    warm_solution, _ = solve_sdvrp_with_metaheuristic(
+                                        selected_file, None, time_limit=max_time / 10, n_restarts=1)
+                                    warm_routes = warm_solution.routes
+                                # Gurobi ne dispose que du temps restant sur le budget total
+                                remaining_time = max(max_time - (time.time() - start_time), 1)
+                                solution, solution_content = solve_sdvrp_with_gurobi_advanced(
+                                    selected_file, output_file, time_limit=remaining_time,
+                                    warm_routes=warm_routes)
                         
-                        # Lire la solution
-                        solution = parse_solution_file(output_file)
+                        # La solution est renvoyée directement par le solveur (pas de relecture du fichier)
                         if solution:
                             solver_instance = DummyExactSolver(
                                 case_data['num_clients'],
@@ -348,9 +315,6 @@ def main():
                             display_solution_details(solver_instance, solution, solve_time)
                             
                             # Bouton de téléchargement
-                            with open(output_file, 'r') as f:
-                                solution_content = f.read()
-                                
                             st.download_button(
                                 label="📥 Télécharger la Solution",
                                 data=solution_content,
@@ -9,24 +9,53 @@ Team Members:
 Institution: CENTRALE CASABLANCA
 Year: 2024-2025
 """
-import math
+import multiprocessing
+import os
 import random
+import time
 from collections import deque
-from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Tuple
 
-class SDVRP_Solution:
-    def __init__(self, routes, cost, deliveries, truck_loads):
-        self.routes = routes
-        self.cost = cost
-        self.num_deliveries = deliveries
-        self.truck_loads = truck_loads
+import numpy as np
+from numba import cuda, njit
+from scipy.spatial.distance import pdist, squareform
 
-def solve_sdvrp_with_metaheuristic(input_file, output_file, max_iterations=100, time_limit=300):
+from sdvrp_solution import SDVRP_Solution
+
+# Au-delà de ce nombre de clients, le voisinage est évalué sur GPU si CUDA est disponible
+CUDA_MIN_CLIENTS = 200
+CUDA_THREADS = 256
+NO_MOVE = 1 << 62
+
+class Move(NamedTuple):
+    """Déplacement du client `client` de la position i de la route src vers la position j de dst"""
+    src: int
+    i: int
+    dst: int
+    j: int
+    client: int
+    delta: int
+
+def solve_sdvrp_with_metaheuristic(input_file, output_file, max_iterations=100, time_limit=300, n_restarts=None):
     # Lire les données du fichier d'entrée
     n, Q, demands, coordinates = read_input(input_file)
     
-    # Exécuter la recherche tabou
-    best_solution, best_cost = tabu_search(n, Q, demands, coordinates, max_iterations)
+    # Exécuter la recherche tabou : un redémarrage indépendant par cœur, on garde le meilleur.
+    # Le premier redémarrage part du balayage non décalé.
+    n_restarts = n_restarts or os.cpu_count() or 1
+    seeds = [None] + list(range(1, n_restarts))
+    if n_restarts == 1:
+        results = [tabu_search(n, Q, demands, coordinates, max_iterations, time_limit=time_limit)]
+    else:
+        # "spawn" : ne pas forker le serveur Streamlit multithreadé (risque d'interblocage)
+        with ProcessPoolExecutor(max_workers=min(n_restarts, os.cpu_count() or 1),
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(tabu_search, n, Q, demands, coordinates, max_iterations,
+                                       seed=seed, time_limit=time_limit)
+                       for seed in seeds]
+            results = [future.result() for future in futures]
+    best_solution, best_cost = min(results, key=lambda result: result[1])
     
     # Convertir la solution au format requis
     formatted_solution = []
@@ -43,131 +72,297 @@ def solve_sdvrp_with_metaheuristic(input_file, output_file, max_iterations=100,
         formatted_solution.append(formatted_route)
         truck_loads.append(load)
     
-    # Écrire la solution dans le fichier de sortie
-    with open(output_file, "w") as f:
-        f.write(f"Total cost: {best_cost:.2f}\n")
-        for i, route in enumerate(formatted_solution, 1):
-            route_str = "0"  # Début au dépôt
-            for client, qty in route:
-                route_str += f" - {client} ({qty})"
-            route_str += " - 0"  # Retour au dépôt
-            f.write(f"Route {i}: {route_str}\n")
-        f.write(f"Number of deliveries: {num_deliveries}\n")
-        f.write(f"Trucks loads: {' '.join(map(str, truck_loads))}\n")
-
-    return SDVRP_Solution(formatted_solution, best_cost, num_deliveries, truck_loads)
+    # Texte de la solution, écrit dans le fichier de sortie (sauf si output_file est None)
+    lines = [f"Total cost: {best_cost:.2f}"]
+    for i, route in enumerate(formatted_solution, 1):
+        route_str = "0"  # Début au dépôt
+        for client, qty in route:
+            route_str += f" - {client} ({qty})"
+        route_str += " - 0"  # Retour au dépôt
+        lines.append(f"Route {i}: {route_str}")
+    lines.append(f"Number of deliveries: {num_deliveries}")
+    lines.append(f"Trucks loads: {' '.join(map(str, truck_loads))}")
+    solution_content = "\n".join(lines) + "\n"
+
+    if output_file is not None:
+        with open(output_file, "w") as f:
+            f.write(solution_content)
+
+    return SDVRP_Solution(formatted_solution, best_cost, num_deliveries, truck_loads), solution_content
 
 def read_input(file_path):
     """Lire le fichier d'entrée"""
     with open(file_path, "r") as file:
         n, Q = map(int, file.readline().split())
-        demands = list(map(int, file.readline().split()))
-        coordinates = [tuple(map(int, line.split())) for line in file if line.strip()]
+        demands = np.fromstring(file.readline(), dtype=np.int32, sep=" ")
+        coordinates = np.loadtxt(file, dtype=np.float64, max_rows=n + 1, ndmin=2)
 
         if len(demands) != n or len(coordinates) != n + 1:
             raise ValueError("Invalid input file format.")
 
     return n, Q, demands, coordinates
 
-def euclidean_distance(coord1, coord2):
-    """Calculer la distance euclidienne"""
-    return int(math.sqrt((coord2[0] - coord1[0])**2 + (coord2[1] - coord1[1])**2) + 0.5)
-
 def compute_distance_matrix(coordinates):
-    """Générer la matrice des distances"""
-    n = len(coordinates)
-    return [[euclidean_distance(coordinates[i], coordinates[j]) for j in range(n)] for i in range(n)]
+    """Générer la matrice des distances euclidiennes arrondies.
+
+    pdist ne calcule que le triangle supérieur (d(i, j) = d(j, i), d(i, i) = 0),
+    squareform le recopie en matrice carrée. La matrice est stockée en int32
+    (deux fois plus compacte en cache que int64).
+    """
+    coords = np.asarray(coordinates, dtype=np.float64)
+    distances = np.floor(squareform(pdist(coords, 'euclidean')) + 0.5)
+    if distances.size and distances.max() >= np.iinfo(np.int32).max:
+        raise ValueError("Distances trop grandes pour une matrice int32.")
+    return distances.astype(np.int32)
+
+def generate_initial_solution(n, Q, demands, coordinates, rng=None):
+    """Générer une solution initiale par balayage angulaire autour du dépôt.
+
+    Les clients sont triés par angle polaire puis regroupés en routes dans cet
+    ordre tant que la capacité le permet. Si rng est fourni, l'angle de départ
+    du balayage est tiré au hasard.
+    """
+    coords = np.asarray(coordinates, dtype=np.float64)
+    angles = np.arctan2(coords[1:, 1] - coords[0, 1], coords[1:, 0] - coords[0, 0])
+    order = (np.argsort(angles, kind="stable") + 1).tolist()
+    if rng is not None:
+        start = rng.randrange(n)
+        order = order[start:] + order[:start]
 
-def generate_initial_solution(n, Q, demands):
-    """Générer une solution initiale gloutonne"""
     routes = []
-    clients = deque(range(1, n + 1))
-    while clients:
-        current_route = [0]  # Commencer par le dépôt
-        current_load = 0
-
-        for _ in range(len(clients)):
-            client = clients.popleft()
-            if current_load + demands[client - 1] <= Q:
-                current_route.append(client)
-                current_load += demands[client - 1]
-            else:
-                clients.append(client)
-
-        current_route.append(0)  # Retourner au dépôt
-        if len(current_route) > 2:  # Ajouter la route seulement si elle contient des clients
-            routes.append((current_route, current_load))
+    current_route = [0]  # Commencer par le dépôt
+    current_load = 0
+    for client in order:
+        if demands[client - 1] > Q:
+            raise ValueError(f"La demande du client {client} dépasse la capacité du véhicule.")
+        if current_load + demands[client - 1] > Q:
+            routes.append((current_route + [0], current_load))  # Retourner au dépôt
+            current_route = [0]
+            current_load = 0
+        current_route.append(client)
+        current_load += demands[client - 1]
+
+    if len(current_route) > 1:  # Ajouter la route seulement si elle contient des clients
+        routes.append((current_route + [0], current_load))
 
     return routes
 
-def compute_total_cost(routes, distance_matrix):
-    """Calculer le coût total d'une solution"""
+def pack_solution(solution):
+    """Aplatir la solution en tableaux contigus (noeuds, offsets, charges) pour Numba"""
+    route_offsets = np.zeros(len(solution) + 1, dtype=np.int32)
+    route_offsets[1:] = np.cumsum([len(route) for route, _ in solution])
+    route_nodes = np.fromiter((node for route, _ in solution for node in route),
+                              dtype=np.int32, count=route_offsets[-1])
+    loads = np.array([load for _, load in solution], dtype=np.int32)
+    return route_nodes, route_offsets, loads
+
+@njit(cache=True)
+def route_membership(route_nodes, route_offsets, n_nodes):
+    """Table members[r, c] : la route r dessert-elle le client c (test d'appartenance en O(1))"""
+    members = np.zeros((route_offsets.shape[0] - 1, n_nodes), dtype=np.bool_)
+    for r in range(route_offsets.shape[0] - 1):
+        for k in range(route_offsets[r] + 1, route_offsets[r + 1] - 1):
+            members[r, route_nodes[k]] = True
+    return members
+
+@njit(cache=True)
+def compute_total_cost(route_nodes, route_offsets, dist):
+    """Calculer le coût total d'une solution aplatie par pack_solution"""
     total_cost = 0
-    for route, _ in routes:
-        for i in range(len(route) - 1):
-            total_cost += distance_matrix[route[i]][route[i + 1]]
+    for r in range(route_offsets.shape[0] - 1):
+        for k in range(route_offsets[r], route_offsets[r + 1] - 1):
+            total_cost += dist[route_nodes[k], route_nodes[k + 1]]
     return total_cost
 
-def generate_neighbors(current_solution, Q, demands, distance_matrix):
-    """Générer des solutions voisines"""
-    neighbors = []
+@njit(cache=True)
+def move_key(client, src, dst):
+    """Attribut tabou d'un déplacement : client | src << 16 | dst << 32"""
+    return client | (src << 16) | (dst << 32)
+
+@njit(cache=True)
+def best_relocate_move(route_nodes, route_offsets, loads, members, demands, dist, Q, tabu_hashes):
+    """Meilleur déplacement non tabou d'un client vers une autre route.
 
-    for route_idx, (route, load) in enumerate(current_solution):
-        if len(route) <= 3:  # Ignorer les routes avec un seul client
+    Le coût de chaque déplacement est évalué par delta (6 arêtes modifiées),
+    sans construire les solutions voisines. Retourne
+    (delta, route source, position, route destination, position d'insertion),
+    avec route source = -1 si aucun déplacement n'est possible.
+    """
+    n_routes = loads.shape[0]
+    tabu = set(tabu_hashes)
+    best_delta = 0
+    best_src, best_i, best_dst, best_j = -1, -1, -1, -1
+
+    for src in range(n_routes):
+        start, end = route_offsets[src], route_offsets[src + 1]
+        if end - start <= 3:  # Ignorer les routes avec un seul client
             continue
 
-        for i in range(1, len(route) - 1):
-            for j, (other_route, other_load) in enumerate(current_solution):
-                if route_idx == j or route[i] in other_route:
+        for i in range(start + 1, end - 1):
+            c = route_nodes[i]
+            prev_i, next_i = route_nodes[i - 1], route_nodes[i + 1]
+            removal = dist[prev_i, next_i] - dist[prev_i, c] - dist[c, next_i]
+
+            for dst in range(n_routes):
+                if dst == src or members[dst, c] or loads[dst] + demands[c - 1] > Q:
+                    continue
+
+                if move_key(c, src, dst) in tabu:
                     continue
 
-                client = route[i]
-                if other_load + demands[client - 1] <= Q:
-                    new_solution = [list(r) for r, _ in current_solution]
-                    new_loads = [l for _, l in current_solution]
+                d_start, d_end = route_offsets[dst], route_offsets[dst + 1]
+                for j in range(d_start + 1, d_end):
+                    prev_j, next_j = route_nodes[j - 1], route_nodes[j]
+                    delta = removal - dist[prev_j, next_j] + dist[prev_j, c] + dist[c, next_j]
+                    if best_src < 0 or delta < best_delta:
+                        best_delta = delta
+                        best_src, best_i = src, i - start
+                        best_dst, best_j = dst, j - d_start
+
+    return best_delta, best_src, best_i, best_dst, best_j
+
+@cuda.jit
+def eval_moves(route_nodes, route_offsets, node_route, loads, members, demands, dist, Q, tabu_hashes,
+               block_delta, block_move):
+    """Noyau CUDA : le thread idx = p * N + q évalue le déplacement du noeud en position p
+    avant la position q, puis chaque bloc réduit son meilleur (delta, idx)."""
+    best_delta = cuda.shared.array(CUDA_THREADS, dtype=np.int64)
+    best_move = cuda.shared.array(CUDA_THREADS, dtype=np.int64)
+    tid = cuda.threadIdx.x
+    idx = cuda.grid(1)
+    size = route_nodes.shape[0]
+
+    delta = NO_MOVE
+    if idx < size * size:
+        p = idx // size
+        q = idx % size
+        c = route_nodes[p]
+        src = node_route[p]
+        dst = node_route[q]
+        if (c != 0 and src != dst and q > route_offsets[dst]
+                and route_offsets[src + 1] - route_offsets[src] > 3
+                and not members[dst, c] and loads[dst] + demands[c - 1] <= Q):
+            key = np.int64(c) | (np.int64(src) << 16) | (np.int64(dst) << 32)
+            is_tabu = False
+            for t in range(tabu_hashes.shape[0]):
+                if tabu_hashes[t] == key:
+                    is_tabu = True
+            if not is_tabu:
+                prev_i, next_i = route_nodes[p - 1], route_nodes[p + 1]
+                prev_j, next_j = route_nodes[q - 1], route_nodes[q]
+                delta = (dist[prev_i, next_i] - dist[prev_i, c] - dist[c, next_i]
+                         - dist[prev_j, next_j] + dist[prev_j, c] + dist[c, next_j])
 
-                    new_solution[route_idx].remove(client)
-                    new_loads[route_idx] -= demands[client - 1]
+    best_delta[tid] = delta
+    best_move[tid] = idx
+    cuda.syncthreads()
 
-                    new_solution[j].insert(-1, client)
-                    new_loads[j] += demands[client - 1]
+    # Réduction en mémoire partagée (à delta égal, le plus petit idx, comme sur CPU)
+    stride = CUDA_THREADS // 2
+    while stride > 0:
+        if tid < stride:
+            other = tid + stride
+            if (best_delta[other] < best_delta[tid]
+                    or (best_delta[other] == best_delta[tid] and best_move[other] < best_move[tid])):
+                best_delta[tid] = best_delta[other]
+                best_move[tid] = best_move[other]
+        cuda.syncthreads()
+        stride //= 2
 
-                    neighbors.append(list(zip(new_solution, new_loads)))
+    if tid == 0:
+        block_delta[cuda.blockIdx.x] = best_delta[0]
+        block_move[cuda.blockIdx.x] = best_move[0]
 
-    return neighbors
+def best_relocate_move_cuda(route_nodes, route_offsets, loads, members, demands, dist, Q, tabu_hashes):
+    """Équivalent GPU de best_relocate_move (demands et dist déjà copiés sur le device).
 
-def tabu_search(n, Q, demands, coordinates, max_iterations=100, tabu_size=10):
-    """Recherche Tabou pour le SDVRP"""
+    Seuls les meilleurs déplacements de chaque bloc sont rapatriés sur l'hôte.
+    """
+    size = route_nodes.shape[0]
+    node_route = np.repeat(np.arange(loads.shape[0], dtype=np.int32), np.diff(route_offsets))
+    n_blocks = (size * size + CUDA_THREADS - 1) // CUDA_THREADS
+    block_delta = cuda.device_array(n_blocks, dtype=np.int64)
+    block_move = cuda.device_array(n_blocks, dtype=np.int64)
+    eval_moves[n_blocks, CUDA_THREADS](
+        cuda.to_device(route_nodes), cuda.to_device(route_offsets), cuda.to_device(node_route),
+        cuda.to_device(loads), cuda.to_device(members), demands, dist, Q, cuda.to_device(tabu_hashes),
+        block_delta, block_move)
+
+    deltas = block_delta.copy_to_host()
+    best = int(np.argmin(deltas))
+    if deltas[best] == NO_MOVE:
+        return 0, -1, -1, -1, -1
+    p, q = divmod(int(block_move.copy_to_host()[best]), size)
+    src, dst = int(node_route[p]), int(node_route[q])
+    return int(deltas[best]), src, p - int(route_offsets[src]), dst, q - int(route_offsets[dst])
+
+def apply_move(solution, move, demands):
+    """Appliquer un déplacement en place sur la solution"""
+    route, load = solution[move.src]
+    route.pop(move.i)
+    solution[move.src] = (route, load - demands[move.client - 1])
+    other_route, other_load = solution[move.dst]
+    other_route.insert(move.j, move.client)
+    solution[move.dst] = (other_route, other_load + demands[move.client - 1])
+
+def tabu_search(n, Q, demands, coordinates, max_iterations=100, tabu_size=10, seed=None, time_limit=None):
+    """Recherche Tabou pour le SDVRP (seed=None : balayage depuis l'angle minimal).
+
+    La recherche s'arrête après max_iterations ou time_limit secondes.
+    """
+    deadline = time.perf_counter() + time_limit if time_limit is not None else None
     distance_matrix = compute_distance_matrix(coordinates)
-    current_solution = generate_initial_solution(n, Q, demands)
-    best_solution = current_solution[:]
-    best_cost = compute_total_cost(best_solution, distance_matrix)
+    demands_arr = np.asarray(demands, dtype=np.int32)
+    rng = random.Random(seed) if seed is not None else None
+    current_solution = generate_initial_solution(n, Q, demands, coordinates, rng)
 
-    tabu_list = []
+    # Évaluation du voisinage sur GPU pour les grandes instances
+    if n > CUDA_MIN_CLIENTS and cuda.is_available():
+        relocate = best_relocate_move_cuda
+        demands_arg, dist_arg = cuda.to_device(demands_arr), cuda.to_device(distance_matrix)
+    else:
+        relocate = best_relocate_move
+        demands_arg, dist_arg = demands_arr, distance_matrix
+    route_nodes, route_offsets, _ = pack_solution(current_solution)
+    current_cost = compute_total_cost(route_nodes, route_offsets, distance_matrix)
+    best_solution = [(list(route), load) for route, load in current_solution]
+    best_cost = current_cost
+
+    # Attributs des déplacements interdits (retour d'un client vers sa route d'origine) :
+    # la deque (bornée) garde l'ordre d'ancienneté, l'ensemble sert aux tests d'appartenance
+    tabu_list = deque(maxlen=tabu_size)
+    tabu_set = set()
     for _ in range(max_iterations):
-        neighbors = generate_neighbors(current_solution, Q, demands, distance_matrix)
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+
+        route_nodes, route_offsets, loads = pack_solution(current_solution)
+        members = route_membership(route_nodes, route_offsets, n + 1)
+        delta, src, i, dst, j = relocate(
+            route_nodes, route_offsets, loads, members, demands_arg, dist_arg, Q,
+            np.fromiter(tabu_set, dtype=np.int64, count=len(tabu_set)))
 
-        if not neighbors:
+        if src < 0:
             continue
 
-        best_neighbor = None
-        best_neighbor_cost = float("inf")
-        for neighbor in neighbors:
-            neighbor_cost = compute_total_cost(neighbor, distance_matrix)
-            if neighbor not in tabu_list and neighbor_cost < best_neighbor_cost:
-                best_neighbor = neighbor
-                best_neighbor_cost = neighbor_cost
+        move = Move(src, i, dst, j, current_solution[src][0][i], delta)
+        apply_move(current_solution, move, demands)
+        current_cost += move.delta
 
-        if best_neighbor:
-            current_solution = best_neighbor
-            tabu_list.append(current_solution)
-            if len(tabu_list) > tabu_size:
-                tabu_list.pop(0)
+        key = move_key(move.client, move.dst, move.src)
+        if tabu_size and key not in tabu_set:
+            if len(tabu_list) == tabu_size:
+                tabu_set.discard(tabu_list[0])  # Évincé par la deque lors de l'ajout
+            tabu_list.append(key)
+            tabu_set.add(key)
 
-        if best_neighbor_cost < best_cost:
-            best_solution = best_neighbor
-            best_cost = best_neighbor_cost
+        if current_cost < best_cost:
+            best_solution = [(list(r), l) for r, l in current_solution]
+            best_cost = current_cost
 
+    # Vérification : le coût suivi par deltas doit correspondre au coût complet
+    route_nodes, route_offsets, _ = pack_solution(best_solution)
+    assert best_cost == compute_total_cost(route_nodes, route_offsets, distance_matrix), "Coût incrémental incohérent"
     return best_solution, best_cost
 
 if __name__ == "__main__":
@@ -0,0 +1,19 @@
+"""
+Split Delivery Vehicle Routing Problem (SDVRP)
+Team Members:
+    - HAMMALE MOURAD
+    - DOHA CHBIHI
+    - AYA BOUKHARI
+    - MOHAMED BENKIRANE
+    - HABBANI MOHAMMED
+Institution: CENTRALE CASABLANCA
+Year: 2024-2025
+"""
+
+
+class SDVRP_Solution:
+    def __init__(self, routes, cost, deliveries, truck_loads):
+        self.routes = routes
+        self.cost = cost
+        self.num_deliveries = deliveries
+        self.truck_loads = truck_loads
@@ -9,33 +9,73 @@ Team Members:
 Institution: CENTRALE CASABLANCA
 Year: 2024-2025
 """
-import math
+import numpy as np
 import gurobipy as gp
 from gurobipy import GRB
-
-def solve_sdvrp_with_gurobi(input_file, output_file, time_limit=None):
+from sdvrp_solution import SDVRP_Solution
+
+def find_subtours(arcs):
+    """Composantes connexes ne contenant pas le dépôt parmi les arcs sélectionnés d'un véhicule"""
+    adjacency = arcs | arcs.T
+    seen = set()
+    subtours = []
+    for start in np.flatnonzero(adjacency.any(axis=1)):
+        if start in seen:
+            continue
+        seen.add(start)
+        component = []
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            component.append(int(node))
+            for neighbor in np.flatnonzero(adjacency[node]):
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    stack.append(neighbor)
+        if 0 not in component:
+            subtours.append(component)
+    return subtours
+
+def subtour_elimination(model, where):
+    """Callback Gurobi : coupes d'élimination des sous-tours ajoutées paresseusement
+
+    Séparées sur les solutions entières (MIPSOL) et, sur le support x > 0.5,
+    sur les relaxations des nœuds (MIPNODE) lorsqu'elles sont violées.
+    """
+    if where == GRB.Callback.MIPSOL:
+        values = np.array(model.cbGetSolution(model._x_flat)).reshape(model._x_shape)
+    elif where == GRB.Callback.MIPNODE and model.cbGet(GRB.Callback.MIPNODE_STATUS) == GRB.OPTIMAL:
+        values = np.array(model.cbGetNodeRel(model._x_flat)).reshape(model._x_shape)
+    else:
+        return
+    arcs = values > 0.5
+    for k in range(arcs.shape[2]):
+        for subtour in find_subtours(arcs[:, :, k]):
+            inside = values[np.ix_(subtour, subtour, [k])].sum()
+            if inside > len(subtour) - 1 + 1e-6:
+                model.cbLazy(gp.quicksum(model._x_vars[i][j][k] for i in subtour for j in subtour if i != j)
+                             <= len(subtour) - 1)
+
+def vehicle_bound(demands, vehicle_capacity):
+    """Borne supérieure M du nombre de véhicules (un véhicule par variable x[:, :, k])"""
+    total_demand = int(np.sum(demands))
+    return total_demand // vehicle_capacity + min(len(demands), total_demand % vehicle_capacity + 1)
+
+def solve_sdvrp_with_gurobi(input_file, output_file, time_limit=None, warm_routes=None):
     # Lire les données à partir du fichier d'entrée
     with open(input_file, 'r') as f:
-        lines = f.readlines()
-
-    # Extraction des paramètres
-    n_clients, vehicle_capacity = map(int, lines[0].strip().split())
-    demands = list(map(int, lines[1].strip().split()))
-    coords = [tuple(map(int, line.strip().split())) for line in lines[2:]]
+        # Extraction des paramètres
+        n_clients, vehicle_capacity = map(int, f.readline().split())
+        demands = np.fromstring(f.readline(), dtype=np.int32, sep=' ')
+        coords = np.loadtxt(f, dtype=np.float64, max_rows=n_clients + 1, ndmin=2)
 
     # Calcul de M (borne supérieure du nombre de véhicules nécessaires)
-    M = sum(demands) // vehicle_capacity + min(len(demands), sum(demands) % vehicle_capacity + 1)
+    M = vehicle_bound(demands, vehicle_capacity)
 
-    # Calcul des distances euclidiennes arrondies selon la formule donnée
-    def calculate_distance(p1, p2):
-        return math.floor(math.sqrt((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2) + 0.5)
-
-    # Création de la matrice des distances
+    # Matrice des distances euclidiennes arrondies : floor(sqrt(dx² + dy²) + 0.5)
     n_nodes = n_clients + 1  # nombre total de nœuds (clients + dépôt)
-    distances = {}
-    for i in range(n_nodes):
-        for j in range(n_nodes):
-            distances[i, j] = calculate_distance(coords[i], coords[j])
+    diff = coords[:, None, :] - coords[None, :, :]
+    distances = np.floor(np.hypot(diff[..., 0], diff[..., 1]) + 0.5).astype(int)
 
     # Création du modèle Gurobi
     model = gp.Model("SD-VRP")
@@ -44,60 +84,75 @@ def solve_sdvrp_with_gurobi(input_file, output_file, time_limit=None):
     if time_limit is not None:
         model.setParam(GRB.Param.TimeLimit, time_limit)
 
-    # Variables de décision
-    x = model.addVars(n_nodes, n_nodes, M, vtype=GRB.BINARY, name="x")
-    y = model.addVars(range(1, n_nodes), range(M), vtype=GRB.CONTINUOUS, name="y")
+    # Variables de décision (API matricielle)
+    # x[i, j, k] : arc (i, j) emprunté par le véhicule k ; pas de self-loops (borne supérieure nulle)
+    arc_ub = np.ones((n_nodes, n_nodes, M))
+    arc_ub[np.arange(n_nodes), np.arange(n_nodes), :] = 0
+    x = model.addMVar((n_nodes, n_nodes, M), vtype=GRB.BINARY, ub=arc_ub, name="x")
+    # y[i - 1, k] : quantité livrée au client i par le véhicule k
+    y = model.addMVar((n_clients, M), vtype=GRB.CONTINUOUS, name="y")
 
     # Fonction objectif: minimiser la distance totale parcourue
-    model.setObjective(gp.quicksum(distances[i, j] * x[i, j, k] for i in range(n_nodes) for j in range(n_nodes) for k in range(M)), GRB.MINIMIZE)
+    model.setObjective((distances[:, :, None] * x).sum(), GRB.MINIMIZE)
 
     # Contraintes
     # Satisfaction des demandes
-    for i in range(1, n_nodes):
-        model.addConstr(gp.quicksum(y[i, k] for k in range(M)) == demands[i - 1], f"Demand_{i}")
+    model.addConstr(y.sum(axis=1) == demands, name="Demand")
 
     # Capacité des véhicules
-    for k in range(M):
-        model.addConstr(gp.quicksum(y[i, k] for i in range(1, n_nodes)) <= vehicle_capacity, f"Capacity_{k}")
+    model.addConstr(y.sum(axis=0) <= vehicle_capacity, name="Capacity")
 
     # Contraintes de flux
-    for k in range(M):
-        model.addConstr(gp.quicksum(x[0, j, k] for j in range(1, n_nodes)) <= 1, f"DepotOut_{k}")
-
-        for i in range(n_nodes):
-            model.addConstr(gp.quicksum(x[i, j, k] for j in range(n_nodes)) == gp.quicksum(x[j, i, k] for j in range(n_nodes)), f"Flow_{i}_{k}")
-
-    # Pas de self-loops
-    for i in range(n_nodes):
-        for k in range(M):
-            model.addConstr(x[i, i, k] == 0, f"NoSelfLoop_{i}_{k}")
+    model.addConstr(x[0, 1:, :].sum(axis=0) <= 1, name="DepotOut")
+    model.addConstr(x.sum(axis=1) == x.sum(axis=0), name="Flow")
+    # Au plus une entrée par client et par véhicule : avec la conservation du flux, les arcs
+    # d'un véhicule forment des cycles simples disjoints (les coupes par composante suffisent)
+    model.addConstr(x[:, 1:, :].sum(axis=0) <= 1, name="InDegree")
 
     # Liaison entre les variables x et y
-    for i in range(1, n_nodes):
-        for k in range(M):
-            model.addConstr(gp.quicksum(x[j, i, k] for j in range(n_nodes)) * vehicle_capacity >= y[i, k], f"Link_{i}_{k}")
-
-    # Élimination des sous-tours
-    u = model.addVars(n_nodes, M, vtype=GRB.CONTINUOUS, name="u")
-    for i in range(1, n_nodes):
-        for j in range(1, n_nodes):
-            if i != j:
-                for k in range(M):
-                    model.addConstr(u[i, k] - u[j, k] + n_nodes * x[i, j, k] <= n_nodes - 1, f"Subtour_{i}_{j}_{k}")
+    model.addConstr(x[:, 1:, :].sum(axis=0) * vehicle_capacity >= y, name="Link")
 
     # Force l'utilisation séquentielle des véhicules
-    for k in range(1, M):
-        model.addConstr(gp.quicksum(x[0, j, k - 1] for j in range(1, n_nodes)) >= gp.quicksum(x[0, j, k] for j in range(1, n_nodes)), f"Sequential_{k}")
+    if M > 1:
+        model.addConstr(x[0, 1:, :-1].sum(axis=0) >= x[0, 1:, 1:].sum(axis=0), name="Sequential")
+
+    # Solution de départ (MIP start), par exemple issue de la métaheuristique :
+    # warm_routes = [[(client, quantité), ...], ...]
+    warm_routes = [route for route in warm_routes or [] if route]
+    if warm_routes and len(warm_routes) <= M:
+        # Routes placées sur les premiers véhicules pour respecter Sequential
+        x_start = np.zeros(x.shape)
+        y_start = np.zeros(y.shape)
+        for k, route in enumerate(warm_routes):
+            nodes = [0] + [client for client, _ in route] + [0]
+            x_start[nodes[:-1], nodes[1:], k] = 1
+            for client, qty in route:
+                y_start[client - 1, k] += qty
+        x.Start = x_start
+        y.Start = y_start
+
+    # Élimination des sous-tours : coupes paresseuses séparées dans le callback
+    model.Params.LazyConstraints = 1
+    model._x_vars = x.tolist()
+    model._x_flat = [var for plane in model._x_vars for row in plane for var in row]
+    model._x_shape = x.shape
 
     # Résolution du modèle
-    model.optimize()
+    model.optimize(subtour_elimination)
 
     # Extraction des résultats
-    if model.status == GRB.OPTIMAL or model.status == GRB.TIME_LIMIT:
+    # TIME_LIMIT sans solution réalisable (SolCount == 0) : rien à extraire
+    if (model.status == GRB.OPTIMAL or model.status == GRB.TIME_LIMIT) and model.SolCount > 0:
         routes = []
         total_cost = model.objVal
         truck_loads = [0] * M
         num_deliveries = 0
+        solution_routes = []
+        solution_loads = []
+
+        # Lecture en bloc des valeurs de x et y (un appel à Gurobi par variable matricielle)
+        arcs = x.X > 0.99
+        quantities = y.X
 
         for k in range(M):
             route = []
@@ -105,38 +160,44 @@ def solve_sdvrp_with_gurobi(input_file, output_file, time_limit=None):
             route_exists = False
             while True:
                 next_node = None
-                for j in range(n_nodes):
-                    if x[current, j, k].x > 0.99:
-                        next_node = j
-                        route_exists = True
-                        break
+                successors = np.flatnonzero(arcs[current, :, k])
+                if successors.size:
+                    next_node = int(successors[0])
+                    route_exists = True
 
                 if next_node is None or next_node == 0:
                     if route and route_exists:
                         formatted_deliveries = []
+                        deliveries = []
                         for node in route:
-                            quantity = y[node, k].x
+                            quantity = quantities[node - 1, k]
                             if quantity > 0:
                                 num_deliveries += 1
                                 truck_loads[k] += quantity
                                 formatted_deliveries.append(f"{node} ({int(quantity)})")
+                                deliveries.append((node, int(quantity)))
                         routes.append(f"Route {k + 1}: 0 - " + " - ".join(formatted_deliveries) + " - 0")
+                        if deliveries:
+                            solution_routes.append(deliveries)
+                            solution_loads.append(int(truck_loads[k]))
                     break
 
                 route.append(next_node)
                 current = next_node
 
         # Écriture du fichier de sortie
+        solution_content = "".join(route + '\n' for route in routes)
+        solution_content += f"Total cost: {int(total_cost)}\n"
+        solution_content += f"Number of deliveries: {num_deliveries}\n"
+        solution_content += f"Trucks loads: {' '.join(str(int(load)) for load in truck_loads if load > 0)}\n"
         with open(output_file, 'w', encoding='utf-8') as f:
-            for route in routes:
-                f.write(route + '\n')
-            f.write(f"Total cost: {int(total_cost)}\n")
-            f.write(f"Number of deliveries: {num_deliveries}\n")
-            f.write(f"Trucks loads: {' '.join(str(int(load)) for load in truck_loads if load > 0)}\n")
+            f.write(solution_content)
+
+        return SDVRP_Solution(solution_routes, int(total_cost), num_deliveries, solution_loads), solution_content
 
     else:
         print("No optimal solution found or time limit exceeded.")
-    return None
+    return None, None
 
 
 
@@ -9,9 +9,10 @@ Team Members:
 Institution: CENTRALE CASABLANCA
 Year: 2024-2025
 """
-import math
+import numpy as np
 import gurobipy as gp
 from gurobipy import GRB
+from sdvrp_solution import SDVRP_Solution
 
 def solve_sdvrp_with_gurobi(input_file, output_file, time_limit=None):
     # Lire les données à partir du fichier d'entrée
@@ -26,16 +27,13 @@ def solve_sdvrp_with_gurobi(input_file, output_file, time_limit=None):
     # Calcul de M (borne supérieure du nombre de véhicules nécessaires)
     M = sum(demands) // vehicle_capacity + min(len(demands), sum(demands) % vehicle_capacity + 1)
 
-    # Calcul des distances euclidiennes arrondies selon la formule donnée
-    def calculate_distance(p1, p2):
-        return int(math.sqrt((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2) + 0.5)
-
-    # Création de la matrice des distances
+    # Matrice des distances euclidiennes arrondies : int(sqrt(dx² + dy²) + 0.5)
     n_nodes = n_clients + 1  # nombre total de nœuds (clients + dépôt)
-    distances = {}
-    for i in range(n_nodes):
-        for j in range(n_nodes):
-            distances[i, j] = calculate_distance(coords[i], coords[j])
+    xy = np.asarray(coords[:n_nodes], dtype=np.float64)
+    dx = xy[:, None, 0] - xy[None, :, 0]
+    dy = xy[:, None, 1] - xy[None, :, 1]
+    # Conversion en entiers Python pour les coefficients gurobipy
+    distances = np.floor(np.hypot(dx, dy) + 0.5).astype(np.int32).tolist()
 
     # Création du modèle Gurobi
     model = gp.Model("SD-VRP")
@@ -49,7 +47,7 @@ def solve_sdvrp_with_gurobi(input_file, output_file, time_limit=None):
     y = model.addVars(range(1, n_nodes), range(M), vtype=GRB.CONTINUOUS, name="y")
 
     # Fonction objectif: minimiser la distance totale parcourue
-    model.setObjective(gp.quicksum(distances[i, j] * x[i, j, k] for i in range(n_nodes) for j in range(n_nodes) for k in range(M)), GRB.MINIMIZE)
+    model.setObjective(gp.quicksum(distances[i][j] * x[i, j, k] for i in range(n_nodes) for j in range(n_nodes) for k in range(M)), GRB.MINIMIZE)
 
     # Contraintes
     # Satisfaction des demandes
@@ -93,11 +91,14 @@ def solve_sdvrp_with_gurobi(input_file, output_file, time_limit=None):
     model.optimize()
 
     # Extraction des résultats
-    if model.status == GRB.OPTIMAL or model.status == GRB.TIME_LIMIT:
+    # TIME_LIMIT sans solution réalisable (SolCount == 0) : rien à extraire
+    if (model.status == GRB.OPTIMAL or model.status == GRB.TIME_LIMIT) and model.SolCount > 0:
         routes = []
         total_cost = model.objVal
         truck_loads = [0] * M
         num_deliveries = 0
+        solution_routes = []
+        solution_loads = []
 
         for k in range(M):
             route = []
@@ -114,28 +115,36 @@ def solve_sdvrp_with_gurobi(input_file, output_file, time_limit=None):
                 if next_node is None or next_node == 0:
                     if route and route_exists:
                         formatted_deliveries = []
+                        deliveries = []
                         for node in route:
                             quantity = y[node, k].x
                             if quantity > 0:
                                 num_deliveries += 1
                                 truck_loads[k] += quantity
                                 formatted_deliveries.append(f"{node} ({int(quantity)})")
+                                deliveries.append((node, int(quantity)))
                         routes.append(f"Route {k + 1}: 0 - " + " - ".join(formatted_deliveries) + " - 0")
+                        if deliveries:
+                            solution_routes.append(deliveries)
+                            solution_loads.append(int(truck_loads[k]))
                     break
 
                 route.append(next_node)
                 current = next_node
 
         # Écriture du fichier de sortie
+        solution_content = "".join(route + '\n' for route in routes)
+        solution_content += f"Total cost: {int(total_cost)}\n"
+        solution_content += f"Number of deliveries: {num_deliveries}\n"
+        solution_content += f"Trucks loads: {' '.join(str(int(load)) for load in truck_loads if load > 0)}\n"
         with open(output_file, 'w', encoding='utf-8') as f:
-            for route in routes:
-                f.write(route + '\n')
-            f.write(f"Total cost: {int(total_cost)}\n")
-            f.write(f"Number of deliveries: {num_deliveries}\n")
-            f.write(f"Trucks loads: {' '.join(str(int(load)) for load in truck_loads if load > 0)}\n")
+            f.write(solution_content)
+
+        return SDVRP_Solution(solution_routes, int(total_cost), num_deliveries, solution_loads), solution_content
 
     else:
         print("No optimal solution found or time limit exceeded.")
+    return None, None
 
 
 